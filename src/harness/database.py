@@ -33,13 +33,20 @@ from __future__ import division
 from __future__ import print_function
 
 import base64
+import hashlib
+import hmac
+import io
 import logging
+import os
 import ssl
 import threading
+import traceback
+from datetime import datetime
 
 import six
 from six.moves.BaseHTTPServer import HTTPServer
 from six.moves.SimpleHTTPServer import SimpleHTTPRequestHandler
+from six.moves.socketserver import ThreadingMixIn
 
 import util
 
@@ -47,8 +54,28 @@ import util
 # Create the authorization string.
 _USERNAME = b'username'
 _PASSWORD = b'password'
-_AUTHORIZATION_STRING = 'Basic ' + six.ensure_str(
-    base64.b64encode(_USERNAME + b':' + _PASSWORD))
+_AUTHORIZATION_BYTES = b'Basic ' + base64.b64encode(
+    _USERNAME + b':' + _PASSWORD)
+_AUTHORIZATION_STRING = six.ensure_str(_AUTHORIZATION_BYTES)
+# Digest of the expected authorization header, precomputed at import time so
+# per-request checking is a constant-time digest compare.
+_AUTHORIZATION_DIGEST = hashlib.sha256(_AUTHORIZATION_BYTES).digest()
+
+# 401 log lines and response bodies, built once rather than per request.
+_NO_AUTH_HEADER_LOG = 'Authorization Failed. No Auth header.'
+_NO_AUTH_HEADER_BODY = b'no auth header received.\nIgnore 404 response below.\n\n'
+_BAD_AUTH_LOG = 'Authorization Failed. Incorrect username:password.'
+_BAD_AUTH_BODY = b'Incorrect username:password.\nIgnore 404 response below.\n\n'
+
+
+def _Build401Response(body):
+  """Returns the complete 401 response (status line, headers, body) as bytes."""
+  return six.ensure_binary(
+      'HTTP/1.1 401 Unauthorized\r\nContent-Length: %d\r\n\r\n' % len(body)
+  ) + body
+
+_RESPONSE_401_NO_AUTH_HEADER = _Build401Response(_NO_AUTH_HEADER_BODY)
+_RESPONSE_401_BAD_AUTH = _Build401Response(_BAD_AUTH_BODY)
 
 _SSL_CERT = 'certs/server.cert'
 _SSL_KEY = 'certs/server.key'
@@ -75,19 +102,22 @@ class DatabaseServer(threading.Thread):
     """
     threading.Thread.__init__(self)
     self.name = name
-    self.address = host_name + ':' + str(port)
+    self.address = '%s:%d' % (host_name, port)
     self.port = port
-    self.base_url = 'http' + ('s' if https else '') + '://' + self.address
+    self.base_url = '%s://%s' % ('https' if https else 'http', self.address)
     self.setDaemon(True)
     self.server = DatabaseHTTPServer(('', port), DatabaseHandler,
                                      name, authorization)
     if https:
-      self.server.socket = ssl.wrap_socket(
-          self.server.socket,
-          certfile=_SSL_CERT,
-          keyfile=_SSL_KEY,
-          ca_certs=_SSL_CA_CERT_FILE,
-          server_side=True)
+      # Wrap with a server-side SSLContext rather than the one-shot
+      # ssl.wrap_socket(): the context keeps a TLS session cache, so
+      # reconnecting clients can resume sessions instead of redoing the
+      # full handshake.
+      ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+      ssl_context.load_cert_chain(certfile=_SSL_CERT, keyfile=_SSL_KEY)
+      ssl_context.load_verify_locations(cafile=_SSL_CA_CERT_FILE)
+      self.server.socket = ssl_context.wrap_socket(
+          self.server.socket, server_side=True)
 
   def __del__(self):
     util.releasePort(self.port)
@@ -131,7 +161,7 @@ class DatabaseServer(threading.Thread):
       file_url: The url to provide the file on.
       file_path: The file path to provide on the given url.
     """
-    self.server.file_paths = {file_url: file_path}
+    self.server.updateFilePaths({file_url: file_path})
 
   def setFilesToServe(self, file_url_file_path_dict):
     """Remove existing path mappings and set multiple file url to path mappings.
@@ -140,37 +170,144 @@ class DatabaseServer(threading.Thread):
       file_url_file_path_dict: A dictionary of file_url: file_path as described
         in the setFileToServe description.
     """
-    self.server.file_paths = file_url_file_path_dict
+    self.server.updateFilePaths(file_url_file_path_dict)
 
   def getBaseUrl(self):
     return self.base_url
 
-class DatabaseHTTPServer(HTTPServer):
+class DatabaseHTTPServer(ThreadingMixIn, HTTPServer):
+  # Serve each request on its own thread so that a slow client does not
+  # block the other test clients.
+  daemon_threads = True
+  # Accept backlog passed to listen(): deep enough that simultaneous test
+  # clients do not see connection refusals, but still bounded.
+  request_queue_size = 128
+
   def __init__(self, server_address, RequestHandlerClass, name, authorization):
     HTTPServer.__init__(self, server_address, RequestHandlerClass)
     self.name = name
     self.file_paths = {}
+    self.file_contents = {}
+    # Serializes writers of |file_paths|/|file_contents|. The mappings are
+    # never mutated in place, only replaced wholesale, so request threads
+    # read them without taking the lock (attribute rebinding is atomic).
+    self.file_paths_lock = threading.RLock()
     # Encode the username and password for simple comparison. Expected form is:
     #   'Basic Base64RepresentationOfUsername:Password'
     self.authorization = authorization
 
+  def updateFilePaths(self, file_url_file_path_dict):
+    """Replaces the url to path mapping and preloads the file contents.
+
+    Preloading avoids re-opening and re-reading the same file on every
+    request. Files which cannot be read yet are served from disk at
+    request time instead.
+
+    Args:
+      file_url_file_path_dict: A dictionary of file_url: file_path.
+    """
+    file_contents = {}
+    for file_url, file_path in file_url_file_path_dict.items():
+      try:
+        with open(file_path, 'rb') as handle:
+          file_contents[file_url] = (handle.read(),
+                                     os.path.getmtime(file_path))
+      except (IOError, OSError):
+        continue
+    with self.file_paths_lock:
+      self.file_paths = file_url_file_path_dict
+      self.file_contents = file_contents
+
 class DatabaseHandler(SimpleHTTPRequestHandler):
+  # Speak HTTP/1.1 so that clients may reuse the connection for several
+  # requests instead of paying a TCP (+TLS) handshake per request.
+  protocol_version = 'HTTP/1.1'
+  # Set TCP_NODELAY on each connection: responses are small, so do not let
+  # Nagle delay them behind an ACK.
+  disable_nagle_algorithm = True
+
   def translate_path(self, path):
     """Translate URL paths into filepaths."""
-    if self.server.authorization:
+    if self.server.authorization and not getattr(self, '_authorized', False):
       # Failed Authorization will return a 401 error and the reason why.
       if 'Authorization' not in self.headers:
-        logging.info('Authorization Failed. No Auth header.')
-        self.send_response(401)
-        self.end_headers()
-        self.wfile.write('no auth header received.\n')
-        self.wfile.write('Ignore 404 response below.\n\n')
+        logging.info(_NO_AUTH_HEADER_LOG)
+        self.log_request(401)
+        self.wfile.write(_RESPONSE_401_NO_AUTH_HEADER)
         return ""
-      elif self.headers['Authorization'] != _AUTHORIZATION_STRING:
-        logging.info('Authorization Failed. Incorrect username:password.')
-        self.send_response(401)
-        self.end_headers()
-        self.wfile.write('Incorrect username:password.\n')
-        self.wfile.write('Ignore 404 response below.\n\n')
+      elif not hmac.compare_digest(
+          hashlib.sha256(
+              six.ensure_binary(self.headers['Authorization'])).digest(),
+          _AUTHORIZATION_DIGEST):
+        logging.info(_BAD_AUTH_LOG)
+        self.log_request(401)
+        self.wfile.write(_RESPONSE_401_BAD_AUTH)
         return ""
-    return self.server.file_paths[path] if path in self.server.file_paths else ""
+      # The handler instance lives for the whole (keep-alive) connection, so
+      # remember the successful check and skip re-hashing on later requests.
+      self._authorized = True
+    return self.server.file_paths.get(path, "")
+
+  def do_GET(self):
+    """Serves a GET request.
+
+    When the contents are preloaded, the header block and body are sent
+    with a single write (one sendall syscall) instead of a header write
+    followed by a body copy.
+    """
+    path = self.translate_path(self.path)
+    if not path:
+      self.send_error(404, 'File not found')
+      return
+    cached = self.server.file_contents.get(self.path)
+    if cached is None:
+      SimpleHTTPRequestHandler.do_GET(self)
+      return
+    content, mtime = cached
+    self.log_request(200, len(content))
+    self.wfile.write(
+        six.ensure_binary(
+            'HTTP/1.1 200 OK\r\n'
+            'Content-type: %s\r\n'
+            'Content-Length: %d\r\n'
+            'Last-Modified: %s\r\n\r\n' % (
+                self.guess_type(path), len(content),
+                self.date_time_string(mtime))) + content)
+
+  def send_head(self):
+    """Serves the response headers, preferring the preloaded contents.
+
+    Falls back to the base implementation (which opens the file path) for
+    urls whose contents could not be preloaded.
+    """
+    path = self.translate_path(self.path)
+    if not path:
+      self.send_error(404, 'File not found')
+      return None
+    cached = self.server.file_contents.get(self.path)
+    if cached is None:
+      return SimpleHTTPRequestHandler.send_head(self)
+    content, mtime = cached
+    self.send_response(200)
+    self.send_header('Content-type', self.guess_type(path))
+    self.send_header('Content-Length', str(len(content)))
+    self.send_header('Last-Modified', self.date_time_string(mtime))
+    self.end_headers()
+    return io.BytesIO(content)
+
+  def copyfile(self, source, outputfile):
+    """Copies the served file to the client socket.
+
+    On plain HTTP connections the file is handed to the kernel with
+    zero-copy sendfile(2); TLS sockets cannot use it (payload must pass
+    through the SSL layer), so those fall back to the buffered copy.
+    """
+    if not isinstance(self.connection, ssl.SSLSocket):
+      try:
+        self.wfile.flush()
+        self.connection.sendfile(source)
+        return
+      except (AttributeError, ValueError, OSError):
+        # No sendfile support (platform, python2 or non-regular file).
+        pass
+    SimpleHTTPRequestHandler.copyfile(self, source, outputfile)
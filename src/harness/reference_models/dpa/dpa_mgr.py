@@ -239,6 +239,7 @@ class Dpa(object):
     if sas_th_fads is None: sas_th_fads = []
     # TODO(sbdt): optim = pre-filtering of grants in global DPA neighborhood.
     self._grants = data.getGrantObjectsFromFAD(sas_uut_fad, sas_th_fads)
+    self._inside_grants_cache = None
     self.ResetLists()
     self._has_th_grants = self._DetectIfPeerSas()
 
@@ -246,6 +247,7 @@ class Dpa(object):
     """Sets the list of grants from a list of |data.CbsdGrantInfo|."""
     # TODO(sbdt): optim = pre-filtering of grants in global DPA neighborhood.
     self._grants = grants
+    self._inside_grants_cache = None
     self.ResetLists()
     self._has_th_grants = self._DetectIfPeerSas()
 
@@ -266,11 +268,19 @@ class Dpa(object):
     pool = mpool.Pool()
     self.ResetLists()
     # Detect the inside "inside grants", which will allow to
-    # add them into move list for sure later on.
+    # add them into move list for sure later on. This detection only depends
+    # on the grants and geometry, which are stable across successive runs
+    # (eg Monte Carlo analysis), so the result is cached on the object.
     inside_grants = set()
     if self.geometry and not isinstance(self.geometry, sgeo.Point):
-      inside_grants = set(g for g in self._grants
-                          if sgeo.Point(g.longitude, g.latitude).intersects(self.geometry))
+      cache_key = (id(self._grants), id(self.geometry))
+      cached = getattr(self, '_inside_grants_cache', None)
+      if cached is not None and cached[0] == cache_key:
+        inside_grants = cached[1]
+      else:
+        inside_grants = set(g for g in self._grants
+                            if sgeo.Point(g.longitude, g.latitude).intersects(self.geometry))
+        self._inside_grants_cache = (cache_key, inside_grants)
 
     for chan_idx, (low_freq, high_freq) in enumerate(self._channels):
       moveListConstraint = functools.partial(
@@ -165,6 +165,7 @@ from __future__ import print_function
 import argparse
 import copy
 from six.moves import cPickle
+import gzip
 import logging
 import sys
 import time
@@ -172,7 +173,9 @@ import time
 from absl import app
 import matplotlib.pyplot as plt
 import numpy as np
+from scipy.spatial import cKDTree
 import shapely.geometry as sgeo
+from shapely.prepared import prep
 from six.moves import range
 
 from reference_models.common import mpool
@@ -255,23 +258,34 @@ _LOGGER_MAP = {
 
 # Simulation data saved to cache file when using --cache-file
 def SaveDataToCache(cache_file, sim_data):
-  """Save simulation data to pickled file."""
-  with open(cache_file, 'w') as fd:
-    cPickle.dump(sim_data, fd)
+  """Save simulation data to gzipped pickled file."""
+  with gzip.open(cache_file, 'wb') as fd:
+    cPickle.dump(sim_data, fd, protocol=cPickle.HIGHEST_PROTOCOL)
   print('Simulation data saved to %s' % cache_file)
 
 
-def SyntheticMoveList(ml_list, method, num, chan_idx):
+def ProgressTick(k, num, sym='.'):
+  """Prints one progress symbol, flushing every 10 ticks and on the last one."""
+  sys.stdout.write(sym)
+  if (k + 1) % 10 == 0 or k + 1 == num:
+    sys.stdout.flush()
+
+
+def SyntheticMoveList(ml_list, method, num, chan_idx, ml_size=None):
   """Gets a synthetic move list from a list of them according to some criteria.
 
   See options `ref_ml_method` and `ref_ml_num`.
+  `ml_size` optionally holds the precomputed move list sizes (on the given
+  channel), to avoid recomputing them on every call for sliding windows.
   """
   if num == 0: num = len(ml_list)
-  ml_size = [len(ml[chan_idx]) for ml in ml_list]
+  if ml_size is None:
+    ml_size = np.array([len(ml[chan_idx]) for ml in ml_list])
   if method.startswith('med'):
     # Median method (median size keep list)
-    median_idx = ml_size.index(np.percentile(ml_size[:num], 50,
-                                             interpolation='nearest'))
+    median_idx = np.flatnonzero(
+        ml_size == np.percentile(ml_size[:num], 50,
+                                 interpolation='nearest'))[0]
     ref_ml = ml_list[median_idx]
   elif method.startswith('max'):
     # Max method (bigger move list, ie smallest keep list).
@@ -284,10 +298,12 @@ def SyntheticMoveList(ml_list, method, num, chan_idx):
   elif method.startswith('int'):
     # Intersection method (similar to method of Michael Souryal - NIST).
     # One difference is that we do not remove xx% of extrema.
+    # Reduce from the smallest move list up, so every pairwise
+    # intersection is bounded by the smallest set of the channel.
     ref_ml = []
     for chan in range(len(ml_list[0])):
-      ref_ml.append(set.intersection(*[ml_list[k][chan]
-                                       for k in range(num)]))
+      chan_mls = sorted((m[chan] for m in ml_list[:num]), key=len)
+      ref_ml.append(frozenset(chan_mls[0]).intersection(*chan_mls[1:]))
   elif method.startswith('idx'):
     idx = int(method.split('idx')[1])
     ref_ml = ml_list[idx]
@@ -295,33 +311,62 @@ def SyntheticMoveList(ml_list, method, num, chan_idx):
     raise ValueError('Ref ML method %d unsupported' % method)
   return ref_ml
 
+def LinearMargins(ref_levels, diff_levels, threshold_db, lin_threshold=None):
+  """Computes the linear interference deltas and normalized margins.
+
+  Args:
+    ref_levels: The reference aggregate interference levels (dBm), as ndarray.
+    diff_levels: The UUT-to-reference differences (dB), as ndarray.
+    threshold_db: The DPA protection threshold (dBm).
+    lin_threshold: Optional precomputed Db2Lin(threshold_db), for callers
+      computing margins for several result sets on the same threshold.
+
+  Returns:
+    A tuple (diff_mw, margins_db) of the interference deltas in mW and the
+    margins normalized to the threshold (in dB), each computed with a single
+    fused NumPy expression.
+  """
+  if lin_threshold is None:
+    lin_threshold = Db2Lin(threshold_db)
+  diff_mw = Db2Lin(ref_levels + diff_levels) - Db2Lin(ref_levels)
+  margins_db = Lin2Db(diff_mw + lin_threshold) - threshold_db
+  return diff_mw, margins_db
+
+
+def SortedTailMargins(margins_db, min_margin_db):
+  """Returns the sorted margins above `min_margin_db`.
+
+  Only the tail is extracted and sorted. The mask also drops NaN margins,
+  which occur when the UUT interference drop exceeds the threshold power
+  (ie `diff_mw + lin_threshold < 0` in LinearMargins).
+  """
+  tail = margins_db[margins_db > min_margin_db]
+  tail.sort()
+  return tail
+
+
 def ScatterAnalyze(ref_levels, diff_levels, threshold_db, tag):
   """Plots scatter graph of interference variation."""
-  if not ref_levels: return
-  ref_levels, diff_levels = np.asarray(ref_levels), np.asarray(diff_levels)
+  if not len(ref_levels): return
+  # Convert the threshold to linear once, it is reused by every statistic
+  # and plot below.
+  lin_threshold = Db2Lin(threshold_db)
   # Find the maximum variation in mW
-  diff_mw = Db2Lin(ref_levels + diff_levels) - Db2Lin(ref_levels)
+  diff_mw, margins_db = LinearMargins(ref_levels, diff_levels, threshold_db,
+                                      lin_threshold=lin_threshold)
   max_diff_mw = np.max(diff_mw)
-  max_margin_db = Lin2Db(max_diff_mw + Db2Lin(threshold_db)) - threshold_db
+  max_margin_db = Lin2Db(max_diff_mw + lin_threshold) - threshold_db
   print('Max difference: %g mw ==> %.3fdB (norm to %.0fdBm)' % (
       max_diff_mw, max_margin_db, threshold_db))
   print('Statistics: ')
-  max_diff_1_5 = Db2Lin(threshold_db + 1.5) - Db2Lin(threshold_db)
-  print('  < 1.5dB norm: %.4f%%' % (
-      np.count_nonzero(diff_mw < Db2Lin(threshold_db+1.5)-Db2Lin(threshold_db))
-      / float(len(diff_mw)) * 100.))
-  print('  < 2.0dB norm: %.4f%%' % (
-      np.count_nonzero(diff_mw < Db2Lin(threshold_db+2.0)-Db2Lin(threshold_db))
-      / float(len(diff_mw)) * 100.))
-  print('  < 2.5dB norm: %.4f%%' % (
-      np.count_nonzero(diff_mw < Db2Lin(threshold_db+2.5)-Db2Lin(threshold_db))
-      / float(len(diff_mw)) * 100.))
-  print('  < 3.0dB norm: %.4f%%' % (
-      np.count_nonzero(diff_mw < Db2Lin(threshold_db+3.0)-Db2Lin(threshold_db))
-      / float(len(diff_mw)) * 100.))
-  print('  < 3.5dB norm: %.4f%%' % (
-      np.count_nonzero(diff_mw < Db2Lin(threshold_db+3.5)-Db2Lin(threshold_db))
-      / float(len(diff_mw)) * 100.))
+  # Vectorized percentile stats: one Db2Lin call for all the norm bounds,
+  # and a single sort + searchsorted instead of a count_nonzero per bound.
+  norm_bounds_db = np.arange(1.5, 3.51, 0.5)
+  norm_bounds_mw = Db2Lin(threshold_db + norm_bounds_db) - lin_threshold
+  counts = np.searchsorted(np.sort(diff_mw), norm_bounds_mw)
+  for bound_db, count in zip(norm_bounds_db, counts):
+    print('  < %.1fdB norm: %.4f%%' % (
+        bound_db, count / float(len(diff_mw)) * 100.))
 
   # Plot the scatter plot
   plt.figure()
@@ -332,7 +377,7 @@ def ScatterAnalyze(ref_levels, diff_levels, threshold_db, tag):
   plt.xlabel('Reference aggregate interference (dBm/10MHz)')
   plt.ylabel('SAS UUT difference (dB)')
   plt.scatter(ref_levels, diff_levels, c = 'r', marker='.', s=10)
-  margin_mw = Db2Lin(threshold_db + 1.5) - Db2Lin(threshold_db)
+  margin_mw = norm_bounds_mw[0]  # ie the linear margin @1.5dB
   x_data = np.arange(min(ref_levels), max(ref_levels), 0.01)
   plt.plot(x_data, Lin2Db(Db2Lin(x_data) + margin_mw) - x_data, 'b',
            label='Fixed Linear Margin @1.5dB')
@@ -341,13 +386,13 @@ def ScatterAnalyze(ref_levels, diff_levels, threshold_db, tag):
   plt.legend()
 
   plt.subplot(212)
-  margins_db = Lin2Db(diff_mw + Db2Lin(threshold_db)) - threshold_db
   plt.grid(True)
   plt.ylabel('Complement Log-CDF')
   plt.xlabel('SAS UUT Normalized diff (dB to %ddBm)' % threshold_db)
-  sorted_margins_db = np.sort(margins_db)
-  sorted_margins_db = sorted_margins_db[sorted_margins_db > -5]
-  y_val = 1 - np.arange(len(margins_db), dtype=float) / len(margins_db)
+  # Only the > -5dB tail is plotted: extract it and sort just that.
+  sorted_margins_db = SortedTailMargins(margins_db, -5)
+  num_margins = len(margins_db)
+  y_val = np.linspace(1, 1. / num_margins, num_margins)
   if len(sorted_margins_db):
     plt.plot(sorted_margins_db, y_val[-len(sorted_margins_db):])
   plt.yscale('log', nonposy='clip')
@@ -356,7 +401,8 @@ def ScatterAnalyze(ref_levels, diff_levels, threshold_db, tag):
 def ExtensiveInterferenceCheck(dpa,
                                uut_keep_list, ref_move_lists,
                                ref_ml_num, ref_ml_method,
-                               channel, chan_idx, tag=''):
+                               channel, chan_idx, tag='',
+                               num_repeats=1):
   """Performs extensive interference check of UUT vs many reference move lists.
 
   Args:
@@ -366,6 +412,9 @@ def ExtensiveInterferenceCheck(dpa,
     ref_ml_num & ref_ml_method: The method for building the reference move list
       used for interference check. See module documentation.
     channel & chan_idx: The channels info.
+    num_repeats: Number of times each synthesized move list is checked. Use
+      more than 1 to re-test the same move list against the interference check
+      Monte Carlo randomness.
 
   Returns:
     A tuple of 2 lists (ref_level, diff_levels) holding all the interference
@@ -376,43 +425,83 @@ def ExtensiveInterferenceCheck(dpa,
   diff_levels = []
   start_time = time.time()
   num_synth_ml = 1 if not ref_ml_num else ref_ml_num
-  num_check = len(ref_move_lists) - num_synth_ml + 1
-  for k in range(num_check):
+  num_windows = len(ref_move_lists) - num_synth_ml + 1
+  num_check = num_windows * num_repeats
+  # The sliding windows all reuse the same per-run sizes: compute them once.
+  ml_sizes = np.array([len(m[chan_idx]) for m in ref_move_lists])
+  check_idx = 0
+  for k in range(num_windows):
+    # One synthesis per window; repeats only redo the (random) check.
     dpa.move_lists = SyntheticMoveList(ref_move_lists[k:],
                                        ref_ml_method, ref_ml_num,
-                                       chan_idx)
-    interf_results = []
-    num_success += dpa.CheckInterference(uut_keep_list, dpa.margin_db,
-                                         channel=channel,
-                                         extensive_print=False,
-                                         output_data=interf_results)
-    sys.stdout.write('.'); sys.stdout.flush()
-    for pt_res in interf_results:
-      if not pt_res.A_DPA_ref.shape: continue
-      ref_levels.extend(pt_res.A_DPA_ref)
-      diff_levels.extend(pt_res.A_DPA - pt_res.A_DPA_ref)
-
+                                       chan_idx, ml_size=ml_sizes[k:])
+    for _ in range(num_repeats):
+      interf_results = []
+      num_success += dpa.CheckInterference(uut_keep_list, dpa.margin_db,
+                                           channel=channel,
+                                           extensive_print=False,
+                                           output_data=interf_results)
+      ProgressTick(check_idx, num_check)
+      check_idx += 1
+      # Collect the per-point arrays and concatenate once at the end, instead
+      # of extending python lists element by element.
+      for pt_res in interf_results:
+        if not pt_res.A_DPA_ref.shape: continue
+        ref_levels.append(pt_res.A_DPA_ref)
+        diff_levels.append(pt_res.A_DPA - pt_res.A_DPA_ref)
+
+  ref_levels = np.concatenate(ref_levels) if ref_levels else np.array([])
+  diff_levels = np.concatenate(diff_levels) if diff_levels else np.array([])
   print('   Computation time: %.1fs' % (time.time() - start_time))
   print('Extensive Interference Check:  %d success / %d (%.3f%%)' % (
       num_success, num_check, (100. * num_success) / num_check))
-  if not ref_levels:
+  if not len(ref_levels):
     print('Empty interference - Please check your setup')
 
   ScatterAnalyze(ref_levels, diff_levels, dpa.threshold,
                  tag + 'DPA: %s' % dpa.name)
-  return np.asarray(ref_levels), np.asarray(diff_levels)
+  return ref_levels, diff_levels
 
 
-def PlotMoveListHistogram(move_lists, chan_idx):
-  """Plots an histogram of move lists size."""
-  ref_ml_size = [len(ml[chan_idx]) for ml in move_lists]
+def PlotMoveListHistogram(move_lists, chan_idx, ml_size=None):
+  """Plots an histogram of move lists size.
+
+  `ml_size` optionally holds the precomputed sizes (see SyntheticMoveList).
+  """
+  ref_ml_size = (ml_size if ml_size is not None
+                 else [len(ml[chan_idx]) for ml in move_lists])
+  # Bin with np.histogram and draw bars directly: plt.hist would convert
+  # and re-bin the data internally on every draw.
+  counts, edges = np.histogram(ref_ml_size)
   plt.figure()
-  plt.hist(ref_ml_size)
+  plt.bar(edges[:-1], counts, width=np.diff(edges), align='edge')
   plt.grid(True)
   plt.xlabel('Count')
   plt.ylabel('')
   plt.title('Histogram of move list size across %d runs' % len(ref_ml_size))
 
+def CountGrantsPerCategory(grants):
+  """Returns (num_catb, num_cata_out, num_cata_in) counted in a single pass."""
+  num_catb = num_cata_out = num_cata_in = 0
+  for grant in grants:
+    if grant.cbsd_category == 'B':
+      num_catb += 1
+    elif grant.cbsd_category == 'A':
+      if grant.indoor_deployment:
+        num_cata_in += 1
+      else:
+        num_cata_out += 1
+  return num_catb, num_cata_out, num_cata_in
+
+
+def SplitByManagingSas(grants):
+  """Partitions grants into ([uut_managed], [other_sas]) in a single pass."""
+  managed, other = [], []
+  for g in grants:
+    (managed if g.is_managed_grant else other).append(g)
+  return managed, other
+
+
 def GetMostUsedChannel(dpa):
   """Gets the (channel, chan_idx) of the most used channel in |dpa_mgr.Dpa|."""
   chan_idx = np.argmax([len(dpa.GetNeighborList(chan)) for chan in dpa._channels])
@@ -443,10 +532,23 @@ def FindOrBuildDpa(dpas, options, grants):
     if len(dpas) == 1:
       dpa = dpas[0]
     else:
-      # Roughly find the DPA wth most CBSD within 200km
-      all_cbsds = sgeo.MultiPoint([(g.longitude, g.latitude) for g in grants])
-      num_cbsds_inside = [len(dpa.geometry.buffer(2.5).intersection(all_cbsds))
-                          for dpa in dpas]
+      # Roughly find the DPA wth most CBSD within 200km. A kd-tree over the
+      # CBSD locations prefilters the candidates per DPA so the exact
+      # geometric check only runs on the few nearby points, instead of
+      # intersecting a full MultiPoint with each buffered zone.
+      cbsd_lonlat = np.array([(g.longitude, g.latitude) for g in grants])
+      cbsd_tree = cKDTree(cbsd_lonlat)
+      num_cbsds_inside = []
+      for d in dpas:
+        nbor_zone = d.geometry.buffer(2.5)
+        minx, miny, maxx, maxy = nbor_zone.bounds
+        candidates = cbsd_tree.query_ball_point(
+            ((minx + maxx) / 2., (miny + maxy) / 2.),
+            0.5 * np.hypot(maxx - minx, maxy - miny))
+        prep_zone = prep(nbor_zone)
+        num_cbsds_inside.append(
+            sum(prep_zone.intersects(sgeo.Point(cbsd_lonlat[i]))
+                for i in candidates))
       dpa = dpas[np.argmax(num_cbsds_inside)]
 
   try: dpa.margin_db
@@ -497,9 +599,14 @@ def SetupSimProcessor(num_process, size_tile_cache, geo_points, load_cache=False
 #  sim_data = LoadDataFromCache(cache_file)
 #  CacheAnalyze(sim_data, 'max', 1, 'min', 100)
 def LoadDataFromCache(cache_file):
-  """Load simulation data from pickled file."""
-  with open(cache_file, 'r') as fd:
-    return cPickle.load(fd)
+  """Load simulation data from (possibly gzipped) pickled file."""
+  try:
+    with gzip.open(cache_file, 'rb') as fd:
+      return cPickle.load(fd)
+  except IOError:
+    # Legacy uncompressed cache file.
+    with open(cache_file, 'rb') as fd:
+      return cPickle.load(fd)
 
 def CacheAnalyze(sim_data,
                  ref_ml_method, ref_ml_num,
@@ -539,15 +646,11 @@ def DpaSimulate(config_file, options):
                                   grants)
 
   # Simulation start
+  num_catb, num_cata_out, num_cata_in = CountGrantsPerCategory(grants)
   print('Simulation with DPA `%s` (ref: %d pts):\n'
         '  %d granted CBSDs: %d CatB - %d CatA_out - %d CatA_in' % (
          dpa.name, len(dpa.protected_points),
-         len(grants),
-         len([grant for grant in grants if grant.cbsd_category == 'B']),
-         len([grant for grant in grants
-              if grant.cbsd_category == 'A' and not grant.indoor_deployment]),
-         len([grant for grant in grants
-              if grant.cbsd_category == 'A' and grant.indoor_deployment])))
+         len(grants), num_catb, num_cata_out, num_cata_in))
 
   # Plot the entities.
   ax, _ = sim_utils.CreateCbrsPlot(grants, dpa=dpa)
@@ -570,11 +673,14 @@ def DpaSimulate(config_file, options):
   print('Running Move List algorithm (%d workers): %d times' % (
       num_workers, num_ref_ml))
   start_time = time.time()
-  ref_move_list_runs = []  # Save the move list of each run
+  # Save the move list of each run. ComputeMoveLists() rebinds
+  # dpa.move_lists to a fresh list (see ResetLists()), so the reference can
+  # be stored directly without a defensive copy.
+  ref_move_list_runs = [None] * num_base_ml
   for k in range(num_base_ml):
     dpa.ComputeMoveLists()
-    ref_move_list_runs.append(copy.copy(dpa.move_lists))
-    sys.stdout.write('.'); sys.stdout.flush()
+    ref_move_list_runs[k] = dpa.move_lists
+    ProgressTick(k, num_base_ml)
 
   # Plot the last move list on map.
   for channel in dpa._channels:
@@ -589,11 +695,11 @@ def DpaSimulate(config_file, options):
         dpa_uut.name, dpa_uut.geometry, options.dpa_builder_uut)
     # If UUT has its own parameters, simulate it by running it,
     # otherwise reuse the move lists of the ref model.
-    uut_move_list_runs = []
+    uut_move_list_runs = [None] * num_uut_ml
     for k in range(num_uut_ml):
       dpa_uut.ComputeMoveLists()
-      uut_move_list_runs.append(copy.copy(dpa_uut.move_lists))
-      sys.stdout.write('+'); sys.stdout.flush()
+      uut_move_list_runs[k] = dpa_uut.move_lists
+      ProgressTick(k, num_uut_ml, sym='+')
 
   ref_move_list_runs = ref_move_list_runs[:num_ref_ml]
   print('\n   Computation time: %.1fs' % (time.time() - start_time))
@@ -607,8 +713,11 @@ def DpaSimulate(config_file, options):
 
   # Find a good channel to check: the one with maximum CBSDs.
   channel, chan_idx = GetMostUsedChannel(dpa)
+  # Compute the per-run move list sizes once, shared by the histogram and
+  # the move list synthesis below.
+  ref_ml_sizes = np.array([len(m[chan_idx]) for m in ref_move_list_runs])
   # Plot the move list sizes histogram for that channel.
-  PlotMoveListHistogram(ref_move_list_runs, chan_idx)
+  PlotMoveListHistogram(ref_move_list_runs, chan_idx, ml_size=ref_ml_sizes)
 
   # Analyze aggregate interference. By default:
   #   + uut: taking smallest move list (ie bigger keep list)
@@ -621,7 +730,7 @@ def DpaSimulate(config_file, options):
   # - The ref case first
   dpa.move_lists = SyntheticMoveList(ref_move_list_runs,
                                      options.ref_ml_method, options.ref_ml_num,
-                                     chan_idx)
+                                     chan_idx, ml_size=ref_ml_sizes)
 
   # - The UUT case
   dpa_uut.move_lists = SyntheticMoveList(uut_move_list_runs,
@@ -669,17 +778,17 @@ def DpaAnalyzeLogs(config_file, log_file, options):
   if config_file:
     grants, dpas = sim_utils.ReadTestHarnessConfigFile(config_file)
     # For best robustness, make sure all coordinates are properly rounded, so the
-    # 2 sources of data can be exactly compared.
+    # 2 sources of data can be exactly compared. The log lists are cleaned
+    # and deduplicated into sets in the same pass.
     grants = [sim_utils.CleanGrant(g) for g in grants]
-    ref_nbor_list = [sim_utils.CleanGrant(g) for g in ref_nbor_list]
-    ref_keep_list = [sim_utils.CleanGrant(g) for g in ref_keep_list]
-    uut_keep_list = [sim_utils.CleanGrant(g) for g in uut_keep_list]
+    ref_nbor_list = {sim_utils.CleanGrant(g) for g in ref_nbor_list}
+    ref_keep_list = {sim_utils.CleanGrant(g) for g in ref_keep_list}
+    uut_keep_list = {sim_utils.CleanGrant(g) for g in uut_keep_list}
   else:
     grants, dpas = ref_nbor_list, []
-
-  ref_nbor_list = set(ref_nbor_list)
-  ref_keep_list = set(ref_keep_list)
-  uut_keep_list = set(uut_keep_list)
+    ref_nbor_list = set(ref_nbor_list)
+    ref_keep_list = set(ref_keep_list)
+    uut_keep_list = set(uut_keep_list)
   no_peers = not ref_nbor_list and uut_keep_list
   if no_peers:
     print('NOTE: MCP test with no peer SAS.')
@@ -721,13 +830,11 @@ def DpaAnalyzeLogs(config_file, log_file, options):
   print('  Plotting Map: Nbor list and keep list for channel %s' % (channel,))
   uut_move_list_uut = [g for g in nbor_list
                        if g.is_managed_grant and g not in uut_keep_list]
-  move_list_uut = [g for g in move_list if g.is_managed_grant]
-  move_list_other = [g for g in move_list if not g.is_managed_grant]
+  move_list_uut, move_list_other = SplitByManagingSas(move_list)
 
   if len(ref_nbor_list):
     ref_move_list = nbor_list.difference(ref_keep_list)
-    ref_move_list_uut = [g for g in ref_move_list if g.is_managed_grant]
-    ref_move_list_other = [g for g in ref_move_list if not g.is_managed_grant]
+    ref_move_list_uut, ref_move_list_other = SplitByManagingSas(ref_move_list)
     ax1, fig = sim_utils.CreateCbrsPlot(nbor_list, dpa=dpa, tag='Test Ref ', subplot=121)
     sim_utils.PlotGrants(ax1, ref_move_list_other, color='m')
     sim_utils.PlotGrants(ax1, ref_move_list_uut, color='r')
@@ -751,17 +858,13 @@ def DpaAnalyzeLogs(config_file, log_file, options):
   num_base_ml = max(num_ref_ml, num_uut_ml)
 
   # Summary of the analyze.
+  num_catb, num_cata_out, num_cata_in = CountGrantsPerCategory(nbor_list)
   print('== Analysing DPA `%s` (ref: %d pts) on Channel %s:\n'
         '  %d total grants (all channels)\n'
         '  %d CBSDs in neighbor list: %d CatB - %d CatA_out - %d CatA_in\n' % (
          dpa.name, len(dpa.protected_points), channel,
          len(grants),
-         len(nbor_list),
-         len([grant for grant in nbor_list if grant.cbsd_category == 'B']),
-         len([grant for grant in nbor_list
-              if grant.cbsd_category == 'A' and not grant.indoor_deployment]),
-         len([grant for grant in nbor_list
-              if grant.cbsd_category == 'A' and grant.indoor_deployment])))
+         len(nbor_list), num_catb, num_cata_out, num_cata_in))
 
   # Analyze aggregate interference of TEST-REF vs SAS_UUT keep list
   # ie we repeat the Check N times but with the same ML
@@ -771,11 +874,12 @@ def DpaAnalyzeLogs(config_file, log_file, options):
     print('*****  Re-testing REAL SAS UUT vs %d TEST-REF move list *****' % (num_check))
     print('  Same ref move list each time from TEST - only interference check is random. ')
     full_ref_move_list_runs = [None] * len(dpa._channels)
-    full_ref_move_list_runs[chan_idx] = nbor_list.difference(ref_keep_list)
-    many_ref_move_list_runs = [full_ref_move_list_runs] * num_check
-    ExtensiveInterferenceCheck(dpa, uut_keep_list, many_ref_move_list_runs,
+    # Reuse the reference move list already derived for the map plots.
+    full_ref_move_list_runs[chan_idx] = ref_move_list
+    ExtensiveInterferenceCheck(dpa, uut_keep_list, [full_ref_move_list_runs],
                                1, 'max', channel, chan_idx,
-                               tag='REAL-REF vs REAL-UUT (%dML) - ' % num_check)
+                               tag='REAL-REF vs REAL-UUT (%dML) - ' % num_check,
+                               num_repeats=num_check)
     print('   Computation time: %.1fs' % (time.time() - start_time))
 
   if not options.do_extensive:
@@ -790,11 +894,12 @@ def DpaAnalyzeLogs(config_file, log_file, options):
 
   print('First computing %d reference move lists (%d workers)' % (num_ref_ml, num_workers))
   start_time = time.time()
-  ref_move_list_runs = []  # Save the move list of each run
+  # Save the move list of each run (no copy needed, see DpaSimulate).
+  ref_move_list_runs = [None] * num_base_ml
   for k in range(num_base_ml):
     dpa.ComputeMoveLists()
-    ref_move_list_runs.append(copy.copy(dpa.move_lists))
-    sys.stdout.write('.'); sys.stdout.flush()
+    ref_move_list_runs[k] = dpa.move_lists
+    ProgressTick(k, num_base_ml)
 
   # Now build the UUT dpa and move lists
   dpa_uut = copy.copy(dpa)
@@ -845,33 +950,39 @@ def DpaAnalyzeLogs(config_file, log_file, options):
   print('   Computation time: %.1fs' % (time.time() - start_time))
 
   # Show on same graph the Real UUT CDF vs Good UUT CDF
-  real_diff_mw = Db2Lin(real_levels + real_diffs) - Db2Lin(real_levels)
-  real_margins_db = Lin2Db(real_diff_mw + Db2Lin(dpa.threshold)) - dpa.threshold
-  sorted_real_margins_db = np.sort(real_margins_db)
-  good_diff_mw = Db2Lin(good_levels + good_diffs) - Db2Lin(good_levels)
-  good_margins_db = Lin2Db(good_diff_mw + Db2Lin(dpa.threshold)) - dpa.threshold
-  sorted_good_margins_db = np.sort(good_margins_db)
+  lin_threshold = Db2Lin(dpa.threshold)
+  _, real_margins_db = LinearMargins(real_levels, real_diffs, dpa.threshold,
+                                     lin_threshold=lin_threshold)
+  _, good_margins_db = LinearMargins(good_levels, good_diffs, dpa.threshold,
+                                     lin_threshold=lin_threshold)
   plt.figure()
   plt.title('CDF of Agg Interf Delta: REAL UUT vs GOOD UUT')
   plt.grid(True)
   plt.ylabel('Complement Log-CDF')
   plt.xlabel('SAS UUT Normalized diff (dB to %ddBm)' % dpa.threshold)
-  y_val = 1 - np.arange(len(real_levels), dtype=float) / len(real_levels)
-  sorted_good_margins_db = sorted_good_margins_db[sorted_good_margins_db > -1]
-  sorted_real_margins_db = sorted_real_margins_db[sorted_real_margins_db > -1]
-  if len(sorted_good_margins_db):
-    plt.plot(sorted_good_margins_db, y_val[-len(sorted_good_margins_db):],
-             color='g', label='Good ML')
-  if len(sorted_real_margins_db):
-    plt.plot(sorted_real_margins_db, y_val[-len(sorted_real_margins_db):],
-             color='b', label='Real ML')
+  num_real = len(real_levels)
+  # Degenerate runs (empty interference check) leave the figure without
+  # curves but still complete, so the earlier figures can be reviewed.
+  if num_real:
+    y_val = np.linspace(1, 1. / num_real, num_real)
+    sorted_good_margins_db = SortedTailMargins(good_margins_db, -1)
+    sorted_real_margins_db = SortedTailMargins(real_margins_db, -1)
+    if len(sorted_good_margins_db):
+      plt.plot(sorted_good_margins_db, y_val[-len(sorted_good_margins_db):],
+               color='g', label='Good ML')
+    if len(sorted_real_margins_db):
+      plt.plot(sorted_real_margins_db, y_val[-len(sorted_real_margins_db):],
+               color='b', label='Real ML')
+    plt.legend()
   plt.yscale('log', nonposy='clip')
-  plt.legend()
 
 #---------------------------
 # The simulation
 if __name__ == '__main__':
   options = parser.parse_args()
+  # Batch mode: no interactive redraw on every artist mutation, the figures
+  # are rendered when explicitly shown.
+  plt.ioff()
   if options.log_file or options.config_file.endswith('csv'):
     print('Analyzing log files')
     DpaAnalyzeLogs(options.config_file, options.log_file, options)